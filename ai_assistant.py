@@ -4,6 +4,7 @@ import speech_recognition as sr
 import pyttsx3
 from datetime import datetime
 from deep_translator import GoogleTranslator
+from deep_translator.exceptions import RequestError as TranslatorRequestError
 from PyQt6.QtWidgets import (QApplication, QWidget, QTextBrowser, QVBoxLayout, 
                           QLineEdit, QPushButton, QHBoxLayout, QLabel, 
                           QFrame, QGraphicsDropShadowEffect, QSizePolicy,
@@ -16,21 +17,43 @@ from PyQt6.QtGui import (QColor, QPalette, QFont, QIcon, QLinearGradient,
 import time
 from dotenv import load_dotenv
 from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 import queue
 import re
 import random
+import sqlite3
+import socket
 from mistralai.client import MistralClient
 from mistralai.models.chat_completion import ChatMessage
+from mistralai.exceptions import MistralConnectionException
+import httpx
 import math
 import webbrowser
 import requests
+from urllib.parse import urlparse
 from PIL import Image, ImageDraw, ImageFont
+from audio_worker import (AudioWorkerProcess, create_recognizer,
+                          WAKE_LISTEN_SETTINGS, CONVERSATION_LISTEN_SETTINGS)
 
 load_dotenv()
 
 # Set Mistral API key
 MISTRAL_API_KEY = os.getenv('MISTRAL_API_KEY')
-client = MistralClient(api_key=MISTRAL_API_KEY)
+# HTTP timeout a little above the slowest route budget, so calls we stop waiting on
+# also end and free their worker instead of holding it for the client's 120 s default
+MISTRAL_TIMEOUT = 10
+client = MistralClient(api_key=MISTRAL_API_KEY, timeout=MISTRAL_TIMEOUT, max_retries=1)
+
+# Weather settings; point WEATHER_API_URL at a local stand-in for testing
+WEATHER_API_KEY = os.getenv('WEATHER_API_KEY', '')
+WEATHER_API_URL = os.getenv('WEATHER_API_URL', 'http://api.openweathermap.org/data/2.5/weather')
+WEATHER_FAVOURITE_CITIES = [city.strip() for city in os.getenv('WEATHER_FAVOURITE_CITIES', '').split(',') if city.strip()]
+WEATHER_DEFAULT_CITY = os.getenv('WEATHER_DEFAULT_CITY') or (WEATHER_FAVOURITE_CITIES[0] if WEATHER_FAVOURITE_CITIES else 'London')
+WEATHER_CACHE_TTL = int(os.getenv('WEATHER_CACHE_TTL', '600'))  # Seconds a reading stays fresh
+WEATHER_TIMEOUT = 3  # Seconds to wait for the weather API
+
+# Run audio capture, feature extraction and encoding in a separate worker process
+AUDIO_PROCESS_ENABLED = os.getenv('NOVA_AUDIO_PROCESS', '0') == '1'
 
 # Response queue for threading
 response_queue = queue.Queue()
@@ -51,14 +74,378 @@ def init_text_to_speech():
 # Global TTS engine
 tts_engine = init_text_to_speech()
 
+class CircuitBreaker:
+    """Tracks the health of an upstream service and fails fast while it is down.
+
+    After FAILURE_THRESHOLD consecutive failures the breaker opens and callers
+    skip the service entirely. The health monitor probes open breakers and
+    half-opens them once the host is reachable again; the next real call then
+    closes the breaker or re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    FAILURE_THRESHOLD = 3
+
+    def __init__(self, name, probe_host, probe_port=443):
+        self.name = name
+        self.probe_host = probe_host
+        self.probe_port = probe_port
+        self.state = self.CLOSED
+        self.failures = 0
+        self.lock = threading.Lock()
+
+    def allow(self):
+        return self.state != self.OPEN
+
+    def record_success(self):
+        with self.lock:
+            if self.state != self.CLOSED:
+                print(f"{self.name} recovered")
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.FAILURE_THRESHOLD:
+                if self.state != self.OPEN:
+                    print(f"{self.name} unavailable, switching to offline mode")
+                self.state = self.OPEN
+
+    def probe(self):
+        """Half-open the breaker if the service host accepts connections again"""
+        try:
+            socket.create_connection((self.probe_host, self.probe_port), timeout=2).close()
+        except OSError:
+            return
+        with self.lock:
+            if self.state == self.OPEN:
+                self.state = self.HALF_OPEN
+
+def is_outage(error):
+    """True for connection problems, timeouts and 5xx responses, the only errors breakers count"""
+    while error is not None:
+        if isinstance(error, (ConnectionError, TimeoutError, requests.ConnectionError, requests.Timeout,
+                              httpx.TransportError, MistralConnectionException, TranslatorRequestError)):
+            return True
+        status = getattr(error, "http_status", None)
+        if status is not None:
+            return status >= 500
+        # Client libraries often wrap the transport error they caught
+        error = error.__cause__ or error.__context__
+    return False
+
+# One breaker per upstream service
+mistral_breaker = CircuitBreaker("Mistral", "api.mistral.ai")
+translate_breaker = CircuitBreaker("Translate", "translate.google.com")
+speech_breaker = CircuitBreaker("Speech", "www.google.com")
+weather_url = urlparse(WEATHER_API_URL)
+weather_breaker = CircuitBreaker("Weather", weather_url.hostname,
+                                 weather_url.port or (443 if weather_url.scheme == "https" else 80))
+circuit_breakers = [mistral_breaker, translate_breaker, speech_breaker, weather_breaker]
+
+HEALTH_PROBE_INTERVAL = 5  # Seconds between probes of unhealthy services
+SPEECH_TIMEOUT = 5  # Seconds before a Google speech recognition request is abandoned
+
+def health_monitor_loop():
+    while True:
+        time.sleep(HEALTH_PROBE_INTERVAL)
+        for breaker in circuit_breakers:
+            if breaker.state == CircuitBreaker.OPEN:
+                breaker.probe()
+
+def start_health_monitor():
+    threading.Thread(target=health_monitor_loop, daemon=True).start()
+
+def degraded_services():
+    """Names of upstream services that are currently not healthy"""
+    return [breaker.name for breaker in circuit_breakers if breaker.state != CircuitBreaker.CLOSED]
+
+class ConversationArchive:
+    """Persistent transcript archive backed by SQLite FTS5.
+
+    Messages are queued by the UI and written in batches by a background
+    thread, so recording never blocks the GUI thread.
+    """
+
+    BATCH_SIZE = 100
+    FLUSH_INTERVAL = 0.5  # Seconds to wait for more messages before writing a batch
+
+    def __init__(self, path):
+        self.path = path
+        self.pending = queue.Queue()
+        self.enabled = True
+        try:
+            connection = self.connect()
+            connection.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS messages "
+                "USING fts5(text, role UNINDEXED, created UNINDEXED)"
+            )
+            connection.commit()
+            connection.close()
+        except sqlite3.Error as e:
+            print(f"Conversation archive disabled: {e}")
+            self.enabled = False
+            return
+        self.writer = threading.Thread(target=self.write_loop, daemon=True)
+        self.writer.start()
+
+    def connect(self):
+        connection = sqlite3.connect(self.path, timeout=5)
+        # WAL lets searches read while the writer thread is committing
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def record(self, role, text):
+        if self.enabled and text.strip():
+            self.pending.put_nowait((text.strip(), role, time.time()))
+
+    def write_loop(self):
+        connection = self.connect()
+        while True:
+            batch = [self.pending.get()]
+            if batch[0] is None:
+                break
+            deadline = time.monotonic() + self.FLUSH_INTERVAL
+            stop = False
+            while len(batch) < self.BATCH_SIZE:
+                try:
+                    item = self.pending.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            try:
+                connection.executemany(
+                    "INSERT INTO messages (text, role, created) VALUES (?, ?, ?)", batch
+                )
+                connection.commit()
+            except sqlite3.Error as e:
+                print(f"Conversation archive write error: {e}")
+            if stop:
+                break
+        connection.close()
+
+    def search(self, terms, since=None, roles=("user", "nova"), limit=5):
+        """Return (created, role, text) rows matching terms, best match first.
+
+        Only rows with one of the given roles are returned, so status lines
+        stay out of results unless asked for.
+        """
+        if not self.enabled:
+            return []
+        words = re.findall(r"\w+", terms)
+        if not words:
+            return []
+        # Quote each word so user input is never parsed as FTS5 query syntax
+        match = " ".join(f'"{word}"' for word in words)
+        query = "SELECT created, role, text FROM messages WHERE messages MATCH ?"
+        params = [match]
+        if roles:
+            query += f" AND role IN ({', '.join('?' for _ in roles)})"
+            params.extend(roles)
+        if since is not None:
+            query += " AND created >= ?"
+            params.append(since)
+        query += " ORDER BY rank LIMIT ?"
+        params.append(limit)
+        try:
+            connection = self.connect()
+            try:
+                return connection.execute(query, params).fetchall()
+            finally:
+                connection.close()
+        except sqlite3.Error as e:
+            print(f"Conversation archive search error: {e}")
+            return []
+
+    def close(self):
+        # Wait for the writer to drain everything queued so no message is lost on exit
+        if self.enabled:
+            self.pending.put(None)
+            self.writer.join()
+
+# Phrases that turn a question into an archive search, e.g. "what did nova say about mars last week"
+ARCHIVE_QUERY_PATTERN = re.compile(
+    r"^\s*(?:/search\s+|search (?:history|conversations?) for\s+|(?P<nova_only>what did (?:nova|you) say about\s+))(?P<terms>.+?)[?.!]*\s*$",
+    re.IGNORECASE
+)
+ARCHIVE_PERIODS = {
+    "today": 1,
+    "yesterday": 2,
+    "this week": 7,
+    "last week": 14,
+    "this month": 31,
+    "last month": 62,
+}
+
+# Openings of archive replies, so they can be kept out of the archive itself
+ARCHIVE_FOUND_REPLY = "Here's what I found:"
+ARCHIVE_EMPTY_REPLY = "I couldn't find anything about"
+
+def parse_archive_query(text):
+    """Return (terms, since, roles) if text asks to search the archive, otherwise None"""
+    match = ARCHIVE_QUERY_PATTERN.match(text)
+    if not match:
+        return None
+    terms = match.group("terms").strip()
+    # "What did NOVA say about..." only looks at NOVA's own replies
+    roles = ("nova",) if match.group("nova_only") else ("user", "nova")
+    since = None
+    for period, days in ARCHIVE_PERIODS.items():
+        if terms.lower().endswith(period):
+            terms = terms[:-len(period)].strip()
+            since = time.time() - days * 86400
+            break
+    return terms, since, roles
+
+def strip_speaker_prefix(text):
+    """Drop the "👤 You:" / "🤖 NOVA:" display prefix; the role is stored separately"""
+    return re.sub(r"^\W*(?:You|NOVA):\s*", "", text.strip())
+
+def is_archive_exchange(text):
+    """True for archive queries and their replies, which are not archived themselves"""
+    message = strip_speaker_prefix(text)
+    return bool(parse_archive_query(message)) or message.startswith((ARCHIVE_FOUND_REPLY, ARCHIVE_EMPTY_REPLY))
+
+def search_archive(text):
+    """Answer an archive query with the best matching past messages"""
+    terms, since, roles = parse_archive_query(text)
+    results = conversation_archive.search(terms, since=since, roles=roles)
+    if not results:
+        return f"{ARCHIVE_EMPTY_REPLY} {terms} in our conversations."
+    lines = []
+    for created, role, message in results:
+        when = datetime.fromtimestamp(created).strftime("%b %d %H:%M")
+        speaker = "You said" if role == "user" else "I said"
+        lines.append(f"[{when}] {speaker}: {message}")
+    return f"{ARCHIVE_FOUND_REPLY}\n" + "\n".join(lines)
+
+# Global conversation archive
+conversation_archive = ConversationArchive(os.getenv('NOVA_ARCHIVE_PATH', 'nova_history.db'))
+
+class WeatherService:
+    """Per-city weather cache with asynchronous fetches.
+
+    Readings are kept for WEATHER_CACHE_TTL seconds and favourite cities are
+    refreshed in the background, so most lookups never wait on the network.
+    """
+
+    def __init__(self, url, api_key, ttl, favourite_cities):
+        self.url = url
+        self.api_key = api_key
+        self.ttl = ttl
+        self.favourite_cities = favourite_cities
+        self.cache = {}    # city -> (fetched_at, temperature, description)
+        self.pending = {}  # city -> Future, so concurrent lookups share one request
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=2)
+
+    def start(self):
+        if self.favourite_cities:
+            threading.Thread(target=self.refresh_loop, daemon=True).start()
+
+    def refresh_loop(self):
+        while True:
+            for city in self.favourite_cities:
+                self.fetch_async(city)
+            # Refresh well before readings expire so favourites are always fresh
+            time.sleep(max(self.ttl / 2, 1))
+
+    def get_cached(self, city, max_age=None):
+        max_age = self.ttl if max_age is None else max_age
+        with self.lock:
+            entry = self.cache.get(city.lower())
+        if entry and time.time() - entry[0] <= max_age:
+            return entry
+        return None
+
+    def fetch_async(self, city):
+        key = city.lower()
+        with self.lock:
+            future = self.pending.get(key)
+            if future is None:
+                future = self.executor.submit(self.fetch, city)
+                self.pending[key] = future
+                future.add_done_callback(lambda _: self.pending.pop(key, None))
+        return future
+
+    def fetch(self, city):
+        if not weather_breaker.allow():
+            raise ConnectionError("weather service unavailable")
+        try:
+            response = requests.get(
+                self.url,
+                params={"q": city, "appid": self.api_key, "units": "metric"},
+                timeout=WEATHER_TIMEOUT
+            )
+        except requests.RequestException:
+            # Connection errors and timeouts mean the service itself is unhealthy
+            weather_breaker.record_failure()
+            raise
+        if response.status_code >= 500:
+            weather_breaker.record_failure()
+        else:
+            # A 4xx such as an unknown city still means the service answered
+            weather_breaker.record_success()
+        response.raise_for_status()
+        data = response.json()
+        entry = (time.time(), data['main']['temp'], data['weather'][0]['description'])
+        with self.lock:
+            self.cache[city.lower()] = entry
+        return entry
+
+    def lookup(self, city, timeout=WEATHER_TIMEOUT):
+        """Return (fetched_at, temperature, description) or None if unavailable"""
+        entry = self.get_cached(city)
+        if entry:
+            return entry
+        try:
+            return self.fetch_async(city).result(timeout=timeout)
+        except Exception as e:
+            print(f"Weather lookup failed for {city}: {e}")
+            # A stale reading beats no answer while the service is slow or down
+            return self.get_cached(city, max_age=float('inf'))
+
+# Time phrases that are not part of a city name, e.g. "weather in paris today"
+WEATHER_TIME_PHRASE = (r'\b(?:today|tonight|tomorrow|now|right now|at the moment|currently|'
+                       r'this (?:morning|afternoon|evening|week|weekend))\b')
+WEATHER_TIME_WORDS = re.compile(rf'^(?:\s*{WEATHER_TIME_PHRASE})+|(?:\s*{WEATHER_TIME_PHRASE})+$')
+
+def extract_weather_city(question):
+    """City named in the last "in"/"for" clause of a weather question, or None"""
+    clauses = re.split(r'\b(?:in|for)\s+', question.lower())[1:]
+    # "forecast for tomorrow in paris" -> try "paris" first, then "tomorrow"
+    for clause in reversed(clauses):
+        city = WEATHER_TIME_WORDS.sub('', clause.strip(" ?.!")).strip()
+        if re.fullmatch(r'[a-z][a-z .-]*', city):
+            return city.title()
+    return None
+
+# Global weather service
+weather_service = WeatherService(WEATHER_API_URL, WEATHER_API_KEY, WEATHER_CACHE_TTL, WEATHER_FAVOURITE_CITIES)
+
 class ResponseThread(QThread):
     response_ready = pyqtSignal(str)
 
-    def __init__(self, question):
+    def __init__(self, question, listener):
         super().__init__()
         self.question = question
+        # Typed commands share the listener's local intents, so they work while speech is down
+        self.listener = listener
 
     def run(self):
+        if self.listener.handle_local_intent(self.question):
+            return
+        if parse_archive_query(self.question):
+            self.response_ready.emit(search_archive(self.question))
+            return
         translated_question = translate_to_english(self.question)
         answer = get_answer(translated_question)
         self.response_ready.emit(answer)
@@ -345,6 +732,11 @@ class JarvisUI(QWidget):
         header_layout.addWidget(title_label)
         header_layout.addStretch()
         header_layout.addWidget(self.status_label)
+
+        self.health_label = QLabel("🟢 Online")
+        self.health_label.setFont(QFont("Segoe UI", 11))
+        header_layout.addWidget(self.health_label)
+        self.update_health_status()
         
         container_layout.addWidget(header_frame)
         
@@ -423,11 +815,38 @@ class JarvisUI(QWidget):
         # Connect signals
         self.send_button.clicked.connect(self.handle_text_input)
         
+        # Poll upstream health for the status indicator
+        start_health_monitor()
+        self.health_timer = QTimer(self)
+        self.health_timer.timeout.connect(self.update_health_status)
+        self.health_timer.start(1000)
+
+        self.route_stats_timer = QTimer(self)
+        self.route_stats_timer.timeout.connect(log_route_stats)
+        self.route_stats_timer.start(ROUTE_STATS_LOG_INTERVAL * 1000)
+
+        weather_service.start()
+
         # Start listener thread
         self.listener_thread = ListenerThread()
         self.listener_thread.text_signal.connect(self.handle_thread_signal)
         self.listener_thread.start()
 
+    def update_health_status(self):
+        services = degraded_services()
+        if services:
+            self.health_label.setText(f"🟠 Offline mode: {', '.join(services)} unavailable")
+            color = "#f39c12"
+        else:
+            self.health_label.setText("🟢 Online")
+            color = "#2ecc71"
+        self.health_label.setStyleSheet(f"""
+            color: {color};
+            background: rgba(255, 255, 255, 0.05);
+            padding: 6px 12px;
+            border-radius: 12px;
+        """)
+
     def keyPressEvent(self, event):
         if event.key() == Qt.Key.Key_Return or event.key() == Qt.Key.Key_Enter:
             self.handle_text_input()
@@ -449,9 +868,12 @@ class JarvisUI(QWidget):
         elif "NOVA:" in text:
             self.add_message(text, is_user=False)
         else:
+            conversation_archive.record("status", text)
             self.text_browser.append(f"<span style='color: #888888;'>{text}</span>")
 
     def add_message(self, text, is_user=True):
+        if not is_archive_exchange(text):
+            conversation_archive.record("user" if is_user else "nova", strip_speaker_prefix(text))
         timestamp = datetime.now().strftime("%H:%M")
         if is_user:
             message_html = f"""
@@ -506,7 +928,7 @@ class JarvisUI(QWidget):
             self.send_button.setEnabled(False)
             self.send_button.setText("Thinking...")
             
-            response_thread = ResponseThread(question)
+            response_thread = ResponseThread(question, self.listener_thread)
             response_thread.response_ready.connect(self.handle_response)
             response_thread.finished.connect(lambda: self.reset_send_button())
             response_thread.start()
@@ -524,14 +946,14 @@ class ListenerThread(QThread):
     text_signal = pyqtSignal(str)
 
     def run(self):
+        if AUDIO_PROCESS_ENABLED:
+            self.run_with_audio_process()
+            return
+
         while True:  # Main loop to keep the thread running
             try:
                 # Initialize recognizer for each attempt
-                recognizer = sr.Recognizer()
-                recognizer.energy_threshold = 2500  # Even lower threshold for better sensitivity
-                recognizer.dynamic_energy_threshold = True
-                recognizer.pause_threshold = 1.0  # Longer pause to allow for natural speech
-                recognizer.phrase_threshold = 0.5  # More lenient phrase detection
+                recognizer = create_recognizer(WAKE_LISTEN_SETTINGS, SPEECH_TIMEOUT)
                 
                 # Initialize microphone
                 with sr.Microphone() as source:
@@ -543,25 +965,30 @@ class ListenerThread(QThread):
                     
                     while True:
                         try:
+                            if not speech_breaker.allow():
+                                self.wait_for_speech_service()
+                                continue
+
                             print("Waiting for command...")
-                            audio = recognizer.listen(source, timeout=None, phrase_time_limit=8)
+                            audio = recognizer.listen(source, timeout=None,
+                                                      phrase_time_limit=WAKE_LISTEN_SETTINGS["phrase_time_limit"])
                             
                             try:
                                 command = recognizer.recognize_google(audio).lower()
+                                speech_breaker.record_success()
                                 print(f"Heard: {command}")
                                 
                                 if "nova" in command:
-                                    self.text_signal.emit("\n👤 You: NOVA")
-                                    self.text_signal.emit("🤖 NOVA: Yes, boss? Take your time with your question.")
-                                    speak("Yes, boss? Take your time with your question.")
+                                    self.greet()
                                     self.conversation_mode()
                                     
                             except sr.UnknownValueError:
+                                speech_breaker.record_success()
                                 continue
-                            except sr.RequestError as e:
+                            except (sr.RequestError, TimeoutError) as e:
                                 print(f"Could not request results; {e}")
+                                speech_breaker.record_failure()
                                 self.text_signal.emit("⚠️ Network error. Retrying...")
-                                time.sleep(1)
                                 continue
                                 
                         except Exception as e:
@@ -577,10 +1004,7 @@ class ListenerThread(QThread):
 
     def conversation_mode(self):
         try:
-            recognizer = sr.Recognizer()
-            recognizer.energy_threshold = 3000
-            recognizer.dynamic_energy_threshold = True
-            recognizer.pause_threshold = 0.8
+            recognizer = create_recognizer(CONVERSATION_LISTEN_SETTINGS, SPEECH_TIMEOUT)
             
             with sr.Microphone() as source:
                 self.text_signal.emit("\n🤖 NOVA: I'm listening...")
@@ -591,38 +1015,28 @@ class ListenerThread(QThread):
                 
                 while True:
                     try:
+                        if not speech_breaker.allow():
+                            self.wait_for_speech_service()
+                            continue
+
                         print("Listening for question...")
-                        audio = recognizer.listen(source, timeout=None, phrase_time_limit=5)
+                        audio = recognizer.listen(source, timeout=None,
+                                                  phrase_time_limit=CONVERSATION_LISTEN_SETTINGS["phrase_time_limit"])
                         
                         try:
                             question = recognizer.recognize_google(audio).lower()
+                            speech_breaker.record_success()
                             print(f"Heard: {question}")  # Debugging line
                             
-                            if "goodbye" in question or "bye" in question:
-                                self.text_signal.emit("\n👤 You: " + question)
-                                self.text_signal.emit("🤖 NOVA: Goodbye! Call me if you need anything.")
-                                speak("Goodbye! Call me if you need anything.")
+                            if not self.handle_question(question):
                                 return
                             
-                            # Check for commands
-                            if "set timer" in question:
-                                print("Detected command: set timer")  # Debugging line
-                                self.set_timer(question)
-                            elif "play music" in question:
-                                print("Detected command: play music")  # Debugging line
-                                self.play_music()
-                            else:
-                                print("Processing as a regular question")  # Debugging line
-                                self.text_signal.emit(f"\n👤 You: {question}")
-                                translated_question = translate_to_english(question)
-                                answer = get_answer(translated_question)
-                                self.text_signal.emit(f"🤖 NOVA: {answer}")
-                                speak(answer)
-                            
                         except sr.UnknownValueError:
+                            speech_breaker.record_success()
                             continue
-                        except sr.RequestError as e:
+                        except (sr.RequestError, TimeoutError) as e:
                             print(f"Could not request results; {e}")
+                            speech_breaker.record_failure()
                             continue
                             
                     except Exception as e:
@@ -634,6 +1048,128 @@ class ListenerThread(QThread):
             self.text_signal.emit("⚠️ Microphone error. Please try again.")
             return
 
+    def greet(self):
+        self.text_signal.emit("\n👤 You: NOVA")
+        self.text_signal.emit("🤖 NOVA: Yes, boss? Take your time with your question.")
+        speak("Yes, boss? Take your time with your question.")
+
+    def handle_question(self, question):
+        """Answer one question in conversation mode; returns False when the user says goodbye"""
+        if "goodbye" in question or "bye" in question:
+            self.text_signal.emit("\n👤 You: " + question)
+            self.text_signal.emit("🤖 NOVA: Goodbye! Call me if you need anything.")
+            speak("Goodbye! Call me if you need anything.")
+            return False
+
+        # Check for commands
+        if parse_archive_query(question):
+            self.text_signal.emit(f"\n👤 You: {question}")
+            answer = search_archive(question)
+            self.text_signal.emit(f"🤖 NOVA: {answer}")
+            speak(answer)
+        elif self.handle_local_intent(question):
+            pass
+        else:
+            print("Processing as a regular question")  # Debugging line
+            self.text_signal.emit(f"\n👤 You: {question}")
+            translated_question = translate_to_english(question)
+            answer = get_answer(translated_question)
+            self.text_signal.emit(f"🤖 NOVA: {answer}")
+            speak(answer)
+
+        return True
+
+    def handle_local_intent(self, question):
+        """Run commands that need no language model (timers, music, weather); returns True if handled"""
+        question = question.lower()
+        if "set timer" in question:
+            print("Detected command: set timer")  # Debugging line
+            self.set_timer(question)
+        elif "play music" in question:
+            print("Detected command: play music")  # Debugging line
+            self.play_music()
+        elif "weather" in question:
+            self.tell_weather(question)
+        else:
+            return False
+        return True
+
+    def run_with_audio_process(self):
+        # Audio capture stays here; listening, calibration and encoding run in the worker process
+        while True:
+            worker = AudioWorkerProcess(operation_timeout=SPEECH_TIMEOUT)
+            try:
+                worker.start()
+                print("\nListening for 'NOVA'... (Audio worker process is active)")
+                self.text_signal.emit("\n🎤 Microphone is active and listening for 'NOVA'...")
+                in_conversation = False
+                # Transcripts are only trusted after the worker reports it is listening again,
+                # so NOVA never hears its own replies
+                ready = False
+
+                while True:
+                    if not speech_breaker.allow():
+                        worker.pause()
+                        ready = False
+                        self.wait_for_speech_service()
+                        worker.pause(False)
+
+                    event = worker.get_event(timeout=0.5)
+                    if event is None:
+                        if not worker.is_alive():
+                            raise RuntimeError("audio worker process exited")
+                        continue
+
+                    kind, payload = event
+                    if kind == "error":
+                        raise RuntimeError(payload)
+                    elif kind == "ready":
+                        ready = True
+                    elif kind == "unknown":
+                        speech_breaker.record_success()
+                    elif kind == "request_error":
+                        print(f"Could not request results; {payload}")
+                        speech_breaker.record_failure()
+                        if not in_conversation:
+                            self.text_signal.emit("⚠️ Network error. Retrying...")
+                    elif kind == "transcript" and ready:
+                        speech_breaker.record_success()
+                        print(f"Heard: {payload}")
+                        if not in_conversation and "nova" not in payload:
+                            continue
+
+                        worker.pause()
+                        ready = False
+                        if in_conversation:
+                            if not self.handle_question(payload):
+                                in_conversation = False
+                                worker.configure(WAKE_LISTEN_SETTINGS)
+                        else:
+                            self.greet()
+                            self.text_signal.emit("\n🤖 NOVA: I'm listening...")
+                            speak("I'm listening...")
+                            in_conversation = True
+                            worker.configure(CONVERSATION_LISTEN_SETTINGS)
+                        worker.pause(False)
+
+            except Exception as e:
+                print(f"Microphone error: {e}")
+                self.text_signal.emit("⚠️ Microphone error. Reinitializing...")
+                time.sleep(2)
+            finally:
+                # Cleanup must never end the retry loop
+                try:
+                    worker.stop()
+                except Exception as e:
+                    print(f"Error stopping audio worker: {e}")
+
+    def wait_for_speech_service(self):
+        # Speech recognition is down; skip network round trips until the health monitor sees it again
+        self.text_signal.emit("⚠️ Speech service unavailable. Waiting for it to come back...")
+        while not speech_breaker.allow():
+            time.sleep(0.5)
+        self.text_signal.emit("🎤 Speech service is back.")
+
     def set_timer(self, question):
         match = re.search(r'(\d+)\s*seconds?', question)
         if match:
@@ -661,68 +1197,220 @@ class ListenerThread(QThread):
             self.text_signal.emit("🎶 No music files found. Opening music in the browser.")
             speak("No music files found. Opening music in the browser.")
 
-    def tell_weather(self):
-        # Replace with your weather API key and endpoint
-        api_key = "YOUR_WEATHER_API_KEY"
-        city = "YOUR_CITY"  # You can modify this to get the city from the user
-        url = f"http://api.openweathermap.org/data/2.5/weather?q={city}&appid={api_key}&units=metric"
-        
-        response = requests.get(url)
-        if response.status_code == 200:
-            data = response.json()
-            temperature = data['main']['temp']
-            weather_description = data['weather'][0]['description']
-            self.text_signal.emit(f"The current temperature in {city} is {temperature}°C with {weather_description}.")
-            speak(f"The current temperature in {city} is {temperature} degrees Celsius with {weather_description}.")
+    def tell_weather(self, question=""):
+        city = extract_weather_city(question) or WEATHER_DEFAULT_CITY
+
+        entry = weather_service.lookup(city)
+        if entry:
+            fetched_at, temperature, weather_description = entry
+            # Stale readings served during an outage say how old they are
+            if time.time() - fetched_at > WEATHER_CACHE_TTL:
+                when = f"As of {datetime.fromtimestamp(fetched_at).strftime('%H:%M')}, the temperature"
+            else:
+                when = "The current temperature"
+            self.text_signal.emit(f"🤖 NOVA: {when} in {city} is {temperature}°C with {weather_description}.")
+            speak(f"{when} in {city} is {temperature} degrees Celsius with {weather_description}.")
         else:
             self.text_signal.emit("⚠️ Unable to fetch weather data.")
             speak("Unable to fetch weather data.")
 
-@lru_cache(maxsize=100)
+# Recent translations, checked before the breaker so they keep working offline
+TRANSLATION_CACHE_SIZE = 100
+translation_cache = {}
+translation_cache_lock = threading.Lock()
+
 def translate_to_english(text):
+    with translation_cache_lock:
+        cached_translation = translation_cache.get(text)
+    if cached_translation is not None:
+        return cached_translation
+    if not translate_breaker.allow():
+        return text
     try:
         translated_text = GoogleTranslator(source='auto', target='en').translate(text)
-        return translated_text
-    except Exception:
+    except Exception as e:
+        print(f"Translation error: {e}")
+        if is_outage(e):
+            translate_breaker.record_failure()
         return text
+    translate_breaker.record_success()
+    with translation_cache_lock:
+        translation_cache[text] = translated_text
+        if len(translation_cache) > TRANSLATION_CACHE_SIZE:
+            translation_cache.pop(next(iter(translation_cache)))
+    return translated_text
 
-def get_answer(question):
-    """Get answer using Mistral AI"""
+# Per-category routing: model choice, token cap and latency budget (seconds)
+MODEL_ROUTES = {
+    "capital": {"model": "mistral-tiny", "max_tokens": 30, "timeout": 4.0},
+    "area": {"model": "mistral-tiny", "max_tokens": 20, "timeout": 4.0},
+    "population": {"model": "mistral-tiny", "max_tokens": 20, "timeout": 4.0},
+    "list": {"model": "mistral-small", "max_tokens": 200, "timeout": 8.0},
+    "default": {"model": "mistral-tiny", "max_tokens": 100, "timeout": 6.0},
+}
+OFFLINE_ANSWER = "I'm in offline mode right now, so I can only help with timers, music, weather I've already looked up and questions I've answered before."
+ERROR_ANSWER = "I'm sorry, I couldn't answer that right now. Please try again."
+
+# Faster model used when a route blows its latency budget. Routes already on this
+# model skip the retry and go straight to the answer cache.
+FALLBACK_MODEL = "mistral-tiny"
+FALLBACK_TIMEOUT = 4.0
+FALLBACK_MAX_TOKENS = 100
+
+# Worker pool so a slow Mistral call can be abandoned once its budget is spent
+llm_executor = ThreadPoolExecutor(max_workers=4)
+
+# Last good answer per (category, question), served when the model is too slow
+ANSWER_CACHE_SIZE = 500
+answer_cache = {}
+answer_cache_lock = threading.Lock()
+
+# Per-route latency and token usage, used to tune MODEL_ROUTES
+route_stats = {name: {"calls": 0, "timeouts": 0, "errors": 0, "fallbacks": 0, "cache_hits": 0,
+                      "total_latency": 0.0, "max_latency": 0.0, "total_queue_wait": 0.0,
+                      "total_tokens": 0}
+               for name in MODEL_ROUTES}
+route_stats_lock = threading.Lock()
+
+def classify_question(question):
+    """Pick the route category and prompts for a question"""
+    question_lower = question.lower()
+
+    if "capital" in question_lower:
+        system_prompt = "You are a helpful AI assistant that gives very concise answers about capital cities. Answer in one short sentence without any additional context."
+        user_prompt = f"What is the official capital city of the country mentioned in this question: {question}"
+        return "capital", system_prompt, user_prompt
+    elif "area" in question_lower or "size" in question_lower:
+        system_prompt = "You are a helpful AI assistant that gives precise numerical answers about geographical areas. Answer with just the number and unit without any additional text."
+        user_prompt = f"What is the total area in square kilometers of the country/region mentioned in: {question}"
+        return "area", system_prompt, user_prompt
+    elif "population" in question_lower:
+        system_prompt = "You are a helpful AI assistant that gives precise numerical answers about population. Answer with just the number without any additional text."
+        user_prompt = f"What is the current population of the location mentioned in: {question}"
+        return "population", system_prompt, user_prompt
+    elif "list" in question_lower or "what are" in question_lower:
+        system_prompt = "You are a helpful AI assistant that creates concise numbered lists. Format the response as a simple numbered list without any introduction or conclusion."
+        user_prompt = f"List only the top 5 most important items for: {question}"
+        return "list", system_prompt, user_prompt
+
+    system_prompt = "You are a helpful AI assistant that gives very concise, direct answers. Answer in one sentence without any additional context or explanation."
+    return "default", system_prompt, question
+
+def record_route_stats(category, **updates):
+    with route_stats_lock:
+        stats = route_stats[category]
+        for key, value in updates.items():
+            if key == "max_latency":
+                stats[key] = max(stats[key], value)
+            else:
+                stats[key] += value
+
+def get_route_stats():
+    """Snapshot of per-route stats with average latency in seconds"""
+    with route_stats_lock:
+        snapshot = {name: dict(stats) for name, stats in route_stats.items()}
+    for stats in snapshot.values():
+        answered = stats["calls"] - stats["timeouts"] - stats["errors"]
+        stats["avg_latency"] = stats["total_latency"] / answered if answered else 0.0
+        stats["avg_queue_wait"] = stats["total_queue_wait"] / answered if answered else 0.0
+    return snapshot
+
+ROUTE_STATS_LOG_INTERVAL = 300  # Seconds between route stats summaries in the console
+
+def log_route_stats():
+    for name, stats in get_route_stats().items():
+        if stats["calls"] or stats["cache_hits"]:
+            print(f"Route {name}: {stats['calls']} calls, {stats['timeouts']} timeouts, "
+                  f"{stats['errors']} errors, {stats['fallbacks']} fallbacks, {stats['cache_hits']} cache hits, "
+                  f"avg {stats['avg_latency']:.2f}s (max {stats['max_latency']:.2f}s), "
+                  f"avg queue wait {stats['avg_queue_wait']:.2f}s, {stats['total_tokens']} tokens")
+
+def request_completion(category, model, messages, max_tokens, timeout):
+    """Call Mistral with a latency budget, raising TimeoutError when it is exceeded"""
+    submitted = time.perf_counter()
+
+    def timed_chat(**kwargs):
+        # Latency is measured from when a worker picks the call up; queue wait is tracked separately
+        started = time.perf_counter()
+        return client.chat(**kwargs), started
+
+    future = llm_executor.submit(
+        timed_chat,
+        model=model,
+        messages=messages,
+        temperature=0.1,
+        max_tokens=max_tokens,
+        top_p=0.9,
+        random_seed=42  # For consistent responses
+    )
     try:
-        # Prepare the prompt based on question type
-        question_lower = question.lower()
-        
-        if "capital" in question_lower:
-            system_prompt = "You are a helpful AI assistant that gives very concise answers about capital cities. Answer in one short sentence without any additional context."
-            user_prompt = f"What is the official capital city of the country mentioned in this question: {question}"
-        elif "area" in question_lower or "size" in question_lower:
-            system_prompt = "You are a helpful AI assistant that gives precise numerical answers about geographical areas. Answer with just the number and unit without any additional text."
-            user_prompt = f"What is the total area in square kilometers of the country/region mentioned in: {question}"
-        elif "population" in question_lower:
-            system_prompt = "You are a helpful AI assistant that gives precise numerical answers about population. Answer with just the number without any additional text."
-            user_prompt = f"What is the current population of the location mentioned in: {question}"
-        elif "list" in question_lower or "what are" in question_lower:
-            system_prompt = "You are a helpful AI assistant that creates concise numbered lists. Format the response as a simple numbered list without any introduction or conclusion."
-            user_prompt = f"List only the top 5 most important items for: {question}"
-        else:
-            system_prompt = "You are a helpful AI assistant that gives very concise, direct answers. Answer in one sentence without any additional context or explanation."
-            user_prompt = question
+        chat_response, started = future.result(timeout=timeout)
+    except FutureTimeoutError:
+        # The call keeps running in the pool; we just stop waiting for it
+        record_route_stats(category, calls=1, timeouts=1)
+        mistral_breaker.record_failure()
+        raise TimeoutError(f"{model} exceeded {timeout}s budget for '{category}' route")
+    except Exception:
+        record_route_stats(category, calls=1, errors=1)
+        raise
+
+    mistral_breaker.record_success()
+    latency = time.perf_counter() - started
+    usage = getattr(chat_response, "usage", None)
+    tokens = getattr(usage, "total_tokens", 0) or 0
+    record_route_stats(category, calls=1, total_latency=latency, max_latency=latency,
+                       total_queue_wait=started - submitted, total_tokens=tokens)
+    return chat_response
+
+def get_cached_answer(category, cache_key):
+    with answer_cache_lock:
+        answer = answer_cache.get(cache_key)
+    if answer:
+        record_route_stats(category, cache_hits=1)
+    return answer
+
+def get_answer(question):
+    """Get answer using Mistral AI, routed by question category"""
+    # Prepare the prompt based on question type
+    category, system_prompt, user_prompt = classify_question(question)
+    route = MODEL_ROUTES[category]
+    cache_key = (category, question.strip().lower())
+
+    # Fail fast while Mistral is unhealthy
+    if not mistral_breaker.allow():
+        return get_cached_answer(category, cache_key) or OFFLINE_ANSWER
 
+    try:
         # Make the request to Mistral
         messages = [
             ChatMessage(role="system", content=system_prompt),
             ChatMessage(role="user", content=user_prompt)
         ]
-        
-        chat_response = client.chat(
-            model="mistral-tiny",  # Using the tiny model for faster responses
-            messages=messages,
-            temperature=0.1,
-            max_tokens=100,
-            top_p=0.9,
-            random_seed=42  # For consistent responses
-        )
-        
+
+        try:
+            chat_response = request_completion(
+                category, route["model"], messages, route["max_tokens"], route["timeout"]
+            )
+        except TimeoutError as e:
+            print(f"Route timeout: {e}")
+            chat_response = None
+            if route["model"] != FALLBACK_MODEL and mistral_breaker.allow():
+                record_route_stats(category, fallbacks=1)
+                try:
+                    chat_response = request_completion(
+                        category, FALLBACK_MODEL, messages,
+                        min(route["max_tokens"], FALLBACK_MAX_TOKENS), FALLBACK_TIMEOUT
+                    )
+                except TimeoutError as e:
+                    print(f"Fallback timeout: {e}")
+            if chat_response is None:
+                cached_answer = get_cached_answer(category, cache_key)
+                if cached_answer:
+                    return cached_answer
+                if not mistral_breaker.allow():
+                    return OFFLINE_ANSWER
+                return "I'm sorry, that's taking too long to answer right now. Please try again in a moment."
+
         if chat_response and chat_response.choices:
             answer = chat_response.choices[0].message.content.strip()
             # Clean up the response
@@ -730,11 +1418,21 @@ def get_answer(question):
             # Add period if missing and not a list
             if not any(char.isdigit() for char in answer) and not answer.endswith(('.', '!', '?')):
                 answer += '.'
+            with answer_cache_lock:
+                answer_cache.pop(cache_key, None)
+                answer_cache[cache_key] = answer
+                if len(answer_cache) > ANSWER_CACHE_SIZE:
+                    answer_cache.pop(next(iter(answer_cache)))
             return answer
 
     except Exception as e:
         print(f"Error getting answer: {e}")
-        return f"I apologize, but I encountered an error: {str(e)}"
+        if is_outage(e):
+            mistral_breaker.record_failure()
+        cached_answer = get_cached_answer(category, cache_key)
+        if cached_answer:
+            return cached_answer
+        return OFFLINE_ANSWER if not mistral_breaker.allow() else ERROR_ANSWER
     
     return "I'm sorry, I couldn't find accurate information for your question. Could you please rephrase it?"
 
@@ -751,6 +1449,8 @@ def speak(text):
 
 if __name__ == "__main__":
     app = QApplication([])
+    app.aboutToQuit.connect(conversation_archive.close)
+    app.aboutToQuit.connect(log_route_stats)
     jarvis_ui = JarvisUI()
     jarvis_ui.show()
     app.exec()
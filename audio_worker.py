@@ -0,0 +1,315 @@
+"""Out-of-process speech recognition for NOVA.
+
+Energy detection, ambient noise calibration and FLAC encoding are CPU heavy
+and compete with the Qt event loop for the GIL. With this module the UI
+process only reads the microphone and copies raw frames into a shared-memory
+ring buffer; a separate worker process runs the recognizer on those frames
+and sends back transcripts and events over a multiprocessing connection.
+
+The worker is started as ``python audio_worker.py`` rather than through
+multiprocessing's spawn, which would re-run the UI script in the child. This
+way the worker imports only this module and speech_recognition.
+"""
+import atexit
+import json
+import os
+import secrets
+import struct
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+from multiprocessing.connection import Client, Listener
+
+import speech_recognition as sr
+
+RING_SECONDS = 10  # Seconds of audio kept in shared memory
+READ_POLL_INTERVAL = 0.01  # Seconds the worker sleeps while waiting for new frames
+HEADER = struct.Struct("Q")  # Total bytes ever written, stored at the start of the shared memory
+
+# Recognizer settings for waiting on the wake word and for conversation mode
+WAKE_LISTEN_SETTINGS = {
+    "energy_threshold": 2500,  # Even lower threshold for better sensitivity
+    "dynamic_energy_threshold": True,
+    "pause_threshold": 1.0,  # Longer pause to allow for natural speech
+    "phrase_threshold": 0.5,  # More lenient phrase detection
+    "phrase_time_limit": 8,
+}
+CONVERSATION_LISTEN_SETTINGS = {
+    "energy_threshold": 3000,
+    "dynamic_energy_threshold": True,
+    "pause_threshold": 0.8,
+    "phrase_time_limit": 5,
+}
+
+def create_recognizer(settings, operation_timeout=None):
+    recognizer = sr.Recognizer()
+    for name, value in settings.items():
+        if name != "phrase_time_limit":
+            setattr(recognizer, name, value)
+    recognizer.operation_timeout = operation_timeout
+    return recognizer
+
+class AudioRing:
+    """Single-producer, single-consumer ring buffer of raw audio bytes in shared memory"""
+
+    def __init__(self, size, name=None):
+        self.size = size
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=HEADER.size + size)
+            HEADER.pack_into(self.shm.buf, 0, 0)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            if os.name == "posix":
+                # The UI process owns the segment; stop this process's resource
+                # tracker from unlinking it when the worker exits
+                resource_tracker.unregister(self.shm._name, "shared_memory")
+        self.data = self.shm.buf[HEADER.size:HEADER.size + size]
+
+    @property
+    def write_pos(self):
+        return HEADER.unpack_from(self.shm.buf, 0)[0]
+
+    def write(self, data):
+        pos = self.write_pos
+        offset = pos % self.size
+        first = min(len(data), self.size - offset)
+        self.data[offset:offset + first] = data[:first]
+        self.data[:len(data) - first] = data[first:]
+        HEADER.pack_into(self.shm.buf, 0, pos + len(data))
+
+    def read(self, pos, length):
+        """Copy length bytes starting at absolute position pos"""
+        offset = pos % self.size
+        first = min(length, self.size - offset)
+        return bytes(self.data[offset:offset + first]) + bytes(self.data[:length - first])
+
+    def close(self, unlink=False):
+        self.data.release()
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+class RingStream:
+    """Blocking stream over an AudioRing with the read() interface Recognizer expects"""
+
+    def __init__(self, ring, sample_width):
+        self.ring = ring
+        self.sample_width = sample_width
+        self.parent_pid = os.getppid()
+        self.skip_to_live()
+
+    def skip_to_live(self):
+        self.pos = self.ring.write_pos
+
+    def read(self, frames):
+        length = frames * self.sample_width
+        while self.ring.write_pos - self.pos < length:
+            if os.getppid() != self.parent_pid:
+                raise EOFError("UI process exited")
+            time.sleep(READ_POLL_INTERVAL)
+        # If the writer lapped us, drop the overwritten audio and resume from the oldest intact frame
+        oldest = self.ring.write_pos - self.ring.size
+        if self.pos < oldest:
+            self.pos = oldest - oldest % self.sample_width
+        data = self.ring.read(self.pos, length)
+        self.pos += length
+        return data
+
+class SharedMemorySource(sr.AudioSource):
+    """AudioSource backed by frames the UI process writes into shared memory"""
+
+    def __init__(self, ring, sample_rate, sample_width, chunk):
+        self.SAMPLE_RATE = sample_rate
+        self.SAMPLE_WIDTH = sample_width
+        self.CHUNK = chunk
+        self.stream = RingStream(ring, sample_width)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+def run_worker(shm_name, ring_size, sample_rate, sample_width, chunk, operation_timeout, connection):
+    """Worker loop: turn shared-memory audio into transcripts sent over connection"""
+    ring = AudioRing(ring_size, shm_name)
+    source = SharedMemorySource(ring, sample_rate, sample_width, chunk)
+    settings = WAKE_LISTEN_SETTINGS
+    recognizer = None
+    paused = False
+    announce = False
+
+    try:
+        while True:
+            while connection.poll():
+                command, payload = connection.recv()
+                if command == "stop":
+                    return
+                elif command == "configure":
+                    settings = payload
+                    recognizer = None
+                elif command == "pause":
+                    paused = payload
+                    announce = not paused
+
+            if paused:
+                time.sleep(0.1)
+                source.stream.skip_to_live()
+                continue
+
+            if recognizer is None:
+                recognizer = create_recognizer(settings, operation_timeout)
+                source.stream.skip_to_live()
+                recognizer.adjust_for_ambient_noise(source, duration=1)
+                announce = True
+
+            if announce:
+                # Everything sent before this event came from audio the UI no longer wants
+                source.stream.skip_to_live()
+                connection.send(("ready", None))
+                announce = False
+
+            try:
+                # Short wait timeout so new commands are picked up between phrases
+                audio = recognizer.listen(source, timeout=1, phrase_time_limit=settings["phrase_time_limit"])
+            except sr.WaitTimeoutError:
+                continue
+
+            try:
+                connection.send(("transcript", recognizer.recognize_google(audio).lower()))
+            except sr.UnknownValueError:
+                connection.send(("unknown", None))
+            except (sr.RequestError, TimeoutError) as e:
+                connection.send(("request_error", str(e)))
+    except (EOFError, ConnectionError):
+        # The UI process went away; nothing left to report to
+        pass
+    except Exception as e:
+        connection.send(("error", str(e)))
+    finally:
+        ring.close()
+
+def main():
+    """Worker process entry point, started by AudioWorkerProcess"""
+    config = json.loads(sys.argv[1])
+    authkey = bytes.fromhex(sys.stdin.readline().strip())
+    with Listener(("127.0.0.1", 0), authkey=authkey) as listener:
+        # Tell the UI process where to connect, then keep stdout out of its way
+        print(listener.address[1], flush=True)
+        sys.stdout = sys.stderr
+        connection = listener.accept()
+    with connection:
+        run_worker(config["shm_name"], config["ring_size"], config["sample_rate"],
+                   config["sample_width"], config["chunk"], config["operation_timeout"], connection)
+
+class AudioWorkerProcess:
+    """UI-process handle that captures the microphone and drives the recognition worker"""
+
+    def __init__(self, operation_timeout=None):
+        self.operation_timeout = operation_timeout
+        self.microphone = None
+        self.ring = None
+        self.process = None
+        self.connection = None
+        self.capture_thread = None
+        self.capture_error = None
+        self.capturing = False
+
+    def start(self):
+        microphone = sr.Microphone()
+        microphone.__enter__()
+        # Microphone.__enter__ swallows open errors and leaves the stream unset
+        if microphone.stream is None:
+            raise OSError("could not open microphone")
+        self.microphone = microphone
+
+        ring_size = microphone.SAMPLE_RATE * microphone.SAMPLE_WIDTH * RING_SECONDS
+        self.ring = AudioRing(ring_size)
+
+        config = {
+            "shm_name": self.ring.shm.name,
+            "ring_size": ring_size,
+            "sample_rate": microphone.SAMPLE_RATE,
+            "sample_width": microphone.SAMPLE_WIDTH,
+            "chunk": microphone.CHUNK,
+            "operation_timeout": self.operation_timeout,
+        }
+        authkey = secrets.token_bytes(32)
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), json.dumps(config)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+        )
+        self.process.stdin.write(authkey.hex() + "\n")
+        self.process.stdin.close()
+        port = self.process.stdout.readline().strip()
+        self.process.stdout.close()
+        if not port:
+            raise RuntimeError("audio worker process failed to start")
+        self.connection = Client(("127.0.0.1", int(port)), authkey=authkey)
+
+        self.capturing = True
+        self.capture_thread = threading.Thread(target=self.capture_loop, daemon=True)
+        self.capture_thread.start()
+        atexit.register(self.stop)
+
+    def capture_loop(self):
+        # PyAudio releases the GIL while blocked on the device, so this costs the UI almost nothing
+        while self.capturing:
+            try:
+                self.ring.write(self.microphone.stream.read(self.microphone.CHUNK))
+            except Exception as e:
+                self.capture_error = f"capture failed: {e}"
+                return
+
+    def configure(self, settings):
+        self.connection.send(("configure", settings))
+
+    def pause(self, paused=True):
+        self.connection.send(("pause", paused))
+
+    def get_event(self, timeout=None):
+        """Return the next (event, payload) from the worker, or None on timeout"""
+        if self.capture_error:
+            return ("error", self.capture_error)
+        try:
+            if self.connection.poll(timeout):
+                return self.connection.recv()
+        except (EOFError, ConnectionError):
+            return ("error", "audio worker process exited")
+        return None
+
+    def is_alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def stop(self):
+        """Shut down whatever parts of the worker were started; safe on a partial start"""
+        atexit.unregister(self.stop)
+        self.capturing = False
+        if self.connection is not None:
+            try:
+                self.connection.send(("stop", None))
+            except (OSError, EOFError):
+                pass
+            self.connection.close()
+            self.connection = None
+        if self.process is not None:
+            try:
+                self.process.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+            self.process = None
+        if self.capture_thread is not None:
+            self.capture_thread.join(timeout=1)
+            self.capture_thread = None
+        if self.microphone is not None:
+            self.microphone.__exit__(None, None, None)
+            self.microphone = None
+        if self.ring is not None:
+            self.ring.close(unlink=True)
+            self.ring = None
+
+if __name__ == "__main__":
+    main()